@@ -1,13 +1,14 @@
-import random
 import argparse
 import math
-import re
 from typing import List
 
+import numpy as np
+
 
 def generate_torus_links(dims: List[int], bandwidth: str, latency: str):
     """
     Generates the header lines and links for a grid or torus network topology.
+    Links are sorted by (src, dst) node ID.
     Returns (header_line1, header_line2, links)
     """
     num_dims = len(dims)
@@ -18,36 +19,31 @@ def generate_torus_links(dims: List[int], bandwidth: str, latency: str):
     if total_nodes <= 0:
         raise ValueError("The product of the dimensions must be positive.")
 
-    links = []
-    seen_links = set()
-
-    for node_id in range(total_nodes):
-        coords = []
-        temp_id = node_id
-        for i in range(num_dims - 1, -1, -1):
-            base = math.prod(dims[0:i])
-            coord = temp_id // base
-            coords.insert(0, coord)
-            temp_id %= base
-
-        for i in range(num_dims):
-            dim_size = dims[i]
-            current_pos_in_dim = coords[i]
-            is_wrap_around_link = current_pos_in_dim == dim_size - 1
-            if is_wrap_around_link and dim_size < 3:
-                continue
-            neighbor_coords = list(coords)
-            neighbor_coords[i] = (current_pos_in_dim + 1) % dim_size
-            neighbor_id = 0
-            multiplier = 1
-            for j in range(num_dims):
-                neighbor_id += neighbor_coords[j] * multiplier
-                multiplier *= dims[j]
-            link_pair = tuple(sorted((node_id, neighbor_id)))
-            if link_pair not in seen_links:
-                link_str = f"{node_id} {neighbor_id} {bandwidth} {latency} 0"
-                links.append(link_str)
-                seen_links.add(link_pair)
+    # Node IDs are laid out with dims[0] changing fastest.
+    dims_arr = np.array(dims)
+    strides = np.cumprod([1] + list(dims[:-1]))
+    node_ids = np.arange(total_nodes)
+    # coords[n, i] is the coordinate of node n along dim i.
+    coords = (node_ids[:, None] // strides) % dims_arr
+    # The +1 neighbor of every node along every dim, wrapping around at the edge.
+    is_wrap_around_link = coords == dims_arr - 1
+    neighbor_ids = node_ids[:, None] + np.where(
+        is_wrap_around_link, -(dims_arr - 1) * strides, strides
+    )
+    # Wrap-around links are only added for dims of size >= 3, otherwise they
+    # would duplicate the direct link (size 2) or be a self-loop (size 1). With
+    # that, every remaining (node, dim) pair yields a distinct link.
+    valid = ~(is_wrap_around_link & (dims_arr < 3))
+    src = np.broadcast_to(node_ids[:, None], valid.shape)[valid]
+    dst = neighbor_ids[valid]
+    # Order links by (src, dst) on the integer IDs, which is the order they are
+    # written out in, so the link strings never need to be parsed for sorting.
+    order = np.lexsort((dst, src))
+    src, dst = src[order], dst[order]
+    links = [
+        f"{node_id} {neighbor_id} {bandwidth} {latency} 0"
+        for node_id, neighbor_id in zip(src.tolist(), dst.tolist())
+    ]
 
     total_links = len(links)
     header_line1 = f"{total_nodes} 0 {total_links}"
@@ -60,18 +56,32 @@ def write_torus_topology_file(
 ):
     """
     Writes the torus topology to a file given header lines and links.
+    Links are written in the given order, i.e., sorted as returned by
+    generate_torus_links().
     """
+    # Build the whole file up front and emit it with a single binary write.
+    payload = f"{header_line1}\n{header_line2}\n" + "\n".join(links)
     try:
-        with open(output_file, "w") as f:
-            f.write(header_line1 + "\n")
-            f.write(header_line2 + "\n")
-            f.write(
-                "\n".join(sorted(links, key=lambda l: tuple(map(int, l.split()[:2]))))
-            )
+        with open(output_file, "wb") as f:
+            f.write(payload.encode())
     except IOError as e:
         print(f"Error writing to file {output_file}: {e}")
 
 
+def _split_bandwidth(bw: str):
+    """
+    Splits a bandwidth string such as '400Gbps' into its numeric value and unit.
+    """
+    i = 0
+    n = len(bw)
+    while i < n and bw[i] in "0123456789.":
+        i += 1
+    value, unit = bw[:i], bw[i:]
+    if i == 0 or not unit.isalpha():
+        raise ValueError(f"Unrecognized bandwidth format: {bw}")
+    return value, unit
+
+
 def model_contention(links: list, n_links: int, m_jobs: int) -> list:
     """
     For n_links randomly chosen from links, divide their bandwidth by m_jobs.
@@ -84,23 +94,26 @@ def model_contention(links: list, n_links: int, m_jobs: int) -> list:
     """
     if n_links > len(links):
         raise ValueError("n_links cannot be greater than the number of links.")
-    selected_indices = random.sample(range(len(links)), n_links)
+    selected_indices = np.random.default_rng().choice(
+        len(links), size=n_links, replace=False
+    )
     modified_links = links.copy()
-    for idx in selected_indices:
+    # Links usually share a handful of bandwidth strings, only parse each once.
+    divided_bw = {}
+    for idx in selected_indices.tolist():
         parts = modified_links[idx].split()
         bw = parts[2]
-        # Extract numeric value and unit
-        match = re.match(r"([0-9.]+)([A-Za-z]+)", bw)
-        if not match:
-            raise ValueError(f"Unrecognized bandwidth format: {bw}")
-        value, unit = match.groups()
-        new_value = float(value) / m_jobs
-        # Format with up to 6 decimal places, strip trailing zeros
-        new_bw = (
-            f"{new_value:.6f}".rstrip("0").rstrip(".")
-            if "." in f"{new_value:.6f}"
-            else str(new_value)
-        ) + unit
+        new_bw = divided_bw.get(bw)
+        if new_bw is None:
+            value, unit = _split_bandwidth(bw)
+            new_value = float(value) / m_jobs
+            # Format with up to 6 decimal places, strip trailing zeros
+            new_bw = (
+                f"{new_value:.6f}".rstrip("0").rstrip(".")
+                if "." in f"{new_value:.6f}"
+                else str(new_value)
+            ) + unit
+            divided_bw[bw] = new_bw
         parts[2] = new_bw
         modified_links[idx] = " ".join(parts)
     return modified_links
@@ -4,26 +4,32 @@ from math import prod
 
 def create_jobspec(args):
     # Tag all the main jobs with a label 'M', and later background jobs with 'B'.
-    job_list = [[shape, 'M'] for shape in args.jobs]
+    # Shapes and labels are kept in parallel lists indexed by job ID.
+    shapes = list(args.jobs)
+    labels = ['M'] * len(shapes)
     total_nodes = prod(args.torus_dims)
-    assigned_nodes = sum(prod(shape) for shape, _ in job_list)
+    assigned_nodes = sum(map(prod, shapes))
     if assigned_nodes > total_nodes:
         raise RuntimeError(
             f"Total job nodes ({assigned_nodes}) exceed torus capacity ({total_nodes})."
         )
+    bg_nodes = prod(args.bg_shape)
     while total_nodes > assigned_nodes:
-        job_list.append([args.bg_shape, 'B'])
-        assigned_nodes += prod(args.bg_shape)
+        shapes.append(args.bg_shape)
+        labels.append('B')
+        assigned_nodes += bg_nodes
     if assigned_nodes != total_nodes:
         raise RuntimeError(
             f"Total job nodes ({assigned_nodes}) do not fully use capacity ({total_nodes})."
         )
 
-    # Write jobspec to file.
+    # Write jobspec to file in one go.
+    lines = [
+        f"J{i},{label},{','.join(map(str, shape))}\n"
+        for i, (shape, label) in enumerate(zip(shapes, labels))
+    ]
     with open(args.output, "w") as f:
-        for i, [shape, label] in enumerate(job_list):
-            dims = ",".join(map(str, shape))
-            f.write(f"J{i},{label},{dims}\n")
+        f.write("".join(lines))
 
 
 def parse_jobspec(file_path):
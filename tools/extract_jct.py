@@ -1,7 +1,13 @@
 import argparse
-import json
+import csv
+import mmap
+import os
 import re
-import pandas as pd
+
+from json_utils import load_json
+
+# Per-XPU JCT line emitted by ASTRA-sim: "[statistics] [trace] <node ID>, <JCT>".
+_JCT_RE = re.compile(rb"\[statistics\] \[trace\] (\d+), (\d+)")
 
 
 def parse_placement(placement_file):
@@ -16,12 +22,12 @@ def parse_placement(placement_file):
     }
     "J0" is the job name, "J0-0" is the XPU 0 of job J0, which is mapped to physical
     XPU 0. Note that there could be more physical XPUs than required by the jobs.
+    The result is a list indexed by node ID, unplaced nodes are None.
     """
-    node_to_job = {}
-    with open(placement_file, "r") as f:
-        for key, node_id in json.load(f).items():
-            job_name = key.split("-", 1)[0]
-            node_to_job[node_id] = job_name
+    placement = load_json(placement_file)
+    node_to_job = [None] * (max(placement.values(), default=-1) + 1)
+    for key, node_id in placement.items():
+        node_to_job[node_id] = key.split("-", 1)[0]
     return node_to_job
 
 
@@ -30,30 +36,34 @@ def extrac_jct(log_path, placement_map, output_path):
     Extracts JCT from the log file and writes to a CSV file.
     Args:
         log_path (str): Path to the log file containing per-XPU JCT.
-        placement_map (Dict[int, str]): node ID to job name mapping.
+        placement_map (List[str]): job name indexed by node ID.
         output_path (str): The path to the extracted JCT csv.
     """
-    data = []
-    pattern = re.compile(r"\[statistics\] \[trace\] (\d+), (\d+)")
-
-    with open(log_path, "r") as f:
-        for line in f:
-            match = pattern.search(line)
-            if not match:
-                raise RuntimeError(f"No JCT found in line: {line}")
-
-            node_id = int(match.group(1))
-            jct = int(match.group(2))
-            # TODO: Dummy nodes need special treatment.
-            if node_id not in placement_map:
-                raise RuntimeError(f"Node ID {node_id} not found in placement map.")
+    # Per-job max JCT across all of the job's XPUs.
+    job_jct = {}
+    with open(log_path, "rb") as f:
+        # mmap rejects empty files, and an empty log has no JCT anyway.
+        if os.fstat(f.fileno()).st_size == 0:
+            raise RuntimeError(f"No JCT found in {log_path}")
+        # Scan the whole mapped log in one regex pass, other lines are skipped.
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for match in _JCT_RE.finditer(mm):
+                node_id = int(match.group(1))
+                jct = int(match.group(2))
+                # TODO: Dummy nodes need special treatment.
+                job = placement_map[node_id] if node_id < len(placement_map) else None
+                if job is None:
+                    raise RuntimeError(f"Node ID {node_id} not found in placement map.")
 
-            data.append({"Job": placement_map[node_id], "JCT (nsec)": jct})
+                if jct > job_jct.get(job, -1):
+                    job_jct[job] = jct
+    if not job_jct:
+        raise RuntimeError(f"No JCT found in {log_path}")
 
-    df = pd.DataFrame(data)
-    # Group by Job and take the max JCT
-    result = df.groupby("Job")["JCT (nsec)"].max().reset_index()
-    result.to_csv(output_path, index=False)
+    with open(output_path, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["Job", "JCT (nsec)"])
+        writer.writerows(sorted(job_jct.items()))
 
 
 if __name__ == "__main__":
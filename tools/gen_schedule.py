@@ -25,9 +25,7 @@ Usage (per-dim):
 """
 
 import argparse
-import csv
 from pathlib import Path
-from itertools import product
 
 import numpy as np
 
@@ -57,46 +55,72 @@ def generate_schedule(
     X: int,
     Y: int,
     Z: int,
-) -> tuple[list[list[float]], list[list[float]]]:
-    """Return (bw_matrix, lt_matrix) as nested Python lists.
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Return the torus links as (src, dst, bw, lt) arrays, one entry per
+    directed neighbor pair. Every other NPU pair has bw = lt = 0.
 
     1D linearization is X-fastest:
         idx = a + b*X + c*X*Y
     matching precomputeRoutes_DOR() in TopologyManager.cpp.
     """
     N = X * Y * Z
-    bw_matrix = np.zeros((N, N), dtype=float)
-    lt_matrix = np.zeros((N, N), dtype=float)
-
-    def coord_to_index(a, b, c):
-        return a + (b * X) + (c * X * Y)
-
-    for a, b, c in product(range(X), range(Y), range(Z)):
-        idx = coord_to_index(a, b, c)
-        neighbors = [
-            (coord_to_index((a + 1) % X, b, c), bw_per_dim[0], lt_per_dim[0]),
-            (coord_to_index(a, (b + 1) % Y, c), bw_per_dim[1], lt_per_dim[1]),
-            (coord_to_index(a, b, (c + 1) % Z), bw_per_dim[2], lt_per_dim[2]),
-        ]
-        for nbr, bw_v, lt_v in neighbors:
-            if idx != nbr:
-                bw_matrix[idx, nbr] = bw_v
-                bw_matrix[nbr, idx] = bw_v
-                lt_matrix[idx, nbr] = lt_v
-                lt_matrix[nbr, idx] = lt_v
-
-    return bw_matrix.tolist(), lt_matrix.tolist()
-
-
-def write_matrix(path: str, matrix: list[list[float]], tag: str, topo_id: int = 0) -> None:
+    srcs, dsts, bws, lts = [], [], [], []
+
+    # idx[c, b, a] = a + b*X + c*X*Y, so axis 2 is X, axis 1 is Y, axis 0 is Z.
+    idx = np.arange(N).reshape(Z, Y, X)
+    for axis, bw_v, lt_v in zip((2, 1, 0), bw_per_dim, lt_per_dim):
+        # +1 neighbor along this dim with torus wrap-around.
+        nbr = np.roll(idx, -1, axis=axis)
+        # A dim of size 1 only wraps onto itself, skip those self-loops.
+        keep = idx != nbr
+        src, dst = idx[keep], nbr[keep]
+        # Links are bidirectional, emit both directions.
+        srcs += [src, dst]
+        dsts += [dst, src]
+        bws.append(np.full(2 * src.size, bw_v))
+        lts.append(np.full(2 * src.size, lt_v))
+
+    return (
+        np.concatenate(srcs),
+        np.concatenate(dsts),
+        np.concatenate(bws),
+        np.concatenate(lts),
+    )
+
+
+def write_matrix(
+    path: str,
+    N: int,
+    src: np.ndarray,
+    dst: np.ndarray,
+    values: np.ndarray,
+    tag: str,
+    topo_id: int = 0,
+) -> None:
+    """Write the dense N x N matrix given by the (src, dst, values) links.
+
+    The matrix is only ever materialized a block of rows at a time, so memory
+    stays bounded for large tori even though the file itself is O(N^2).
+    """
     p = Path(path)
     p.parent.mkdir(parents=True, exist_ok=True)
+    # Group links by source row so each block is a contiguous slice.
+    order = np.argsort(src, kind="stable")
+    src, dst, values = src[order], dst[order], values[order]
+    # ~1M cells (8 MB) per block.
+    block_rows = max(1, (1 << 20) // max(N, 1))
+    block = np.zeros((block_rows, N), dtype=float)
     with p.open("w") as f:
-        writer = csv.writer(f, delimiter=" ", lineterminator="\n")
-        writer.writerow([tag, topo_id])
-        for row in matrix:
-            writer.writerow(row)
-        writer.writerow(["END"])
+        f.write(f"{tag} {topo_id}\n")
+        for r0 in range(0, N, block_rows):
+            r1 = min(r0 + block_rows, N)
+            lo, hi = np.searchsorted(src, (r0, r1))
+            block.fill(0)
+            block[src[lo:hi] - r0, dst[lo:hi]] = values[lo:hi]
+            # %.15g round-trips any decimal the user can pass via -bw/-lt while
+            # printing whole numbers without a trailing ".0".
+            np.savetxt(f, block[: r1 - r0], fmt="%.15g", delimiter=" ")
+        f.write("END\n")
 
 
 def main():
@@ -128,12 +152,13 @@ def main():
     bw_per_dim = parse_per_dim(args.bandwidth, "-bw")
     lt_per_dim = parse_per_dim(args.latency, "-lt")
 
-    bw_matrix, lt_matrix = generate_schedule(
+    src, dst, bw, lt = generate_schedule(
         bw_per_dim, lt_per_dim,
         args.x_dim, args.y_dim, args.z_dim,
     )
-    write_matrix(args.bw_output, bw_matrix, "BW")
-    write_matrix(args.latency_output, lt_matrix, "LT")
+    N = args.x_dim * args.y_dim * args.z_dim
+    write_matrix(args.bw_output, N, src, dst, bw, "BW")
+    write_matrix(args.latency_output, N, src, dst, lt, "LT")
 
 
 if __name__ == "__main__":
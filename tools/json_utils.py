@@ -0,0 +1,33 @@
+"""
+JSON file helpers shared by the tools.
+orjson is used when it is installed, otherwise the standard json module.
+"""
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    import json
+
+
+def load_json(path):
+    """
+    Reads a JSON file in one shot and parses it.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump_json(obj, path):
+    """
+    Serializes obj with a 2-space indent and writes it out with a single write().
+    """
+    if orjson is not None:
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    else:
+        data = json.dumps(obj, indent=2).encode()
+    with open(path, "wb") as f:
+        f.write(data)
@@ -1,12 +1,16 @@
 import os
 import argparse
-import json
+import itertools
+from concurrent.futures import ProcessPoolExecutor
 
-from chakra.src.third_party.utils.protolib import encodeMessage, decodeMessage
+from google.protobuf.internal import api_implementation
+from google.protobuf.internal.decoder import _DecodeVarint, _DecodeVarint32
+from google.protobuf.internal.encoder import _VarintBytes
+
+from json_utils import load_json, dump_json
 from chakra.schema.protobuf.et_def_pb2 import (
     Node as ChakraNode,
     BoolList,
-    GlobalMetadata,
     AttributeProto as ChakraAttr,
     COMP_NODE,
     COMM_COLL_NODE,
@@ -16,25 +20,45 @@ from chakra.schema.protobuf.et_def_pb2 import (
     ALL_GATHER,
 )
 
-
-class MonotonicCounter:
-    """
-    Non-thread-safe monotonically increasing integer counter.
-    Call fetch() to get the current value and increment it.
-    """
-
-    def __init__(self, start: int = 0):
-        self._counter = start
-
-    def fetch(self) -> int:
-        v = self._counter
-        self._counter += 1
-        return v
+# Point-to-point node types, whose comm_src/comm_dst attrs hold job-local XPU IDs.
+P2P_NODE_TYPES = frozenset((COMM_SEND_NODE, COMM_RECV_NODE))
+XPU_ID_ATTRS = frozenset(("comm_src", "comm_dst"))
+# Scalar integer members of the AttributeProto "value" oneof that can hold an XPU ID.
+XPU_ID_FIELDS = frozenset(
+    (
+        "int32_val",
+        "int64_val",
+        "uint32_val",
+        "uint64_val",
+        "sint32_val",
+        "sint64_val",
+        "fixed32_val",
+        "fixed64_val",
+        "sfixed32_val",
+        "sfixed64_val",
+    )
+)
+# Node types whose attrs need translation, every other node is copied verbatim.
+COMM_NODE_TYPES = P2P_NODE_TYPES | {COMM_COLL_NODE}
+# Output buffer size at which translate_chakra_pb() flushes to disk.
+FLUSH_BYTES = 8 << 20
+# Field number of Node.type in et_def.proto.
+NODE_TYPE_FIELD = ChakraNode.DESCRIPTOR.fields_by_name["type"].number
+# Wire tag of a Node.attr entry (length-delimited) and field number of its name.
+ATTR_TAG = (ChakraNode.DESCRIPTOR.fields_by_name["attr"].number << 3) | 2
+ATTR_TAG_BYTES = _VarintBytes(ATTR_TAG)
+ATTR_NAME_FIELD = ChakraAttr.DESCRIPTOR.fields_by_name["name"].number
+# Serialized names of the attrs to translate, per comm node type.
+TRANSLATED_ATTRS = {
+    COMM_COLL_NODE: frozenset((b"pg_name",)),
+    COMM_SEND_NODE: frozenset(name.encode() for name in XPU_ID_ATTRS),
+    COMM_RECV_NODE: frozenset(name.encode() for name in XPU_ID_ATTRS),
+}
 
 
-def parse_placement(placement_file):
+def parse_placement_indexed(placement_file):
     """
-    Parses a JSON placement file into a dictionary.
+    Parses a JSON placement file into per-job lists indexed by job-local XPU ID.
     Example config:
     {
         "J0-0": 0,
@@ -44,20 +68,73 @@ def parse_placement(placement_file):
     }
     "J0" is the job name, "J0-0" is the XPU 0 of job J0, which is mapped to physical
     XPU 0. Note that there could be more physical XPUs than required by the jobs.
+    The example is parsed into {"J0": [0, 1], "J1": [2, 3]}. Local XPU IDs missing
+    from the config are left as None.
     """
-    with open(placement_file, "r") as f:
-        return json.load(f)
+    placement = {}
+    for key, xpu_id in load_json(placement_file).items():
+        job_name, local_xpu_id = key.rsplit("-", 1)
+        local_xpu_id = int(local_xpu_id)
+        xpu_list = placement.setdefault(job_name, [])
+        if local_xpu_id >= len(xpu_list):
+            xpu_list.extend([None] * (local_xpu_id + 1 - len(xpu_list)))
+        xpu_list[local_xpu_id] = xpu_id
+    return placement
 
 
 def parse_comm_group(comm_group_file):
     """
     Parses a JSON communication group file into a dictionary.
     """
-    with open(comm_group_file, "r") as f:
-        return json.load(f)
+    return load_json(comm_group_file)
+
+
+def _skip_field(buf, pos, wire_type):
+    """
+    Returns the position right after the value of a field whose tag was just read.
+    """
+    if wire_type == 0:
+        _, pos = _DecodeVarint(buf, pos)
+        return pos
+    if wire_type == 2:
+        length, pos = _DecodeVarint(buf, pos)
+        return pos + length
+    if wire_type == 1:
+        return pos + 8
+    if wire_type == 5:
+        return pos + 4
+    raise ValueError(f"Unexpected wire type {wire_type} in Chakra trace")
+
+
+def _peek_node_type(buf, pos, end):
+    """
+    Returns the type of the serialized Node in buf[pos:end] without decoding it.
+    Top-level fields are skipped by wire type until the type field is found.
+    """
+    while pos < end:
+        tag, pos = _DecodeVarint(buf, pos)
+        if tag == NODE_TYPE_FIELD << 3:
+            value, _ = _DecodeVarint(buf, pos)
+            return value
+        pos = _skip_field(buf, pos, tag & 0x7)
+    # proto3 does not serialize the default enum value.
+    return 0
 
 
-def translate_chakra_pb(orig_trace, out_trace, trace_name, comm_group_map, placement_map):
+def _peek_attr_name(buf, pos, end):
+    """
+    Returns the name of the serialized AttributeProto in buf[pos:end] as bytes.
+    """
+    while pos < end:
+        tag, pos = _DecodeVarint(buf, pos)
+        if tag == (ATTR_NAME_FIELD << 3) | 2:
+            length, pos = _DecodeVarint(buf, pos)
+            return bytes(buf[pos : pos + length])
+        pos = _skip_field(buf, pos, tag & 0x7)
+    return b""
+
+
+def translate_chakra_pb(orig_trace, out_trace, trace_name, comm_group_map, xpu_map):
     """
     Translates Chakra protobuf trace to the trace in the merged job.
     This function ensures the pg_name IDs are correctly mapped.
@@ -66,54 +143,145 @@ def translate_chakra_pb(orig_trace, out_trace, trace_name, comm_group_map, place
         out_trace (str): The output trace file path.
         trace_name (str): The trace name, e.g., J0.
         comm_group_map (Dict[str, str]): Mapping from local comm group IDs to global comm group IDs.
-        placement_map (Dict[str, int]): Trace-local XPU ID to physical XPU ID mapping.
-    """
-    global_metadata = GlobalMetadata()
-    node = ChakraNode()
-    with open(orig_trace, "rb") as orig_et, open(out_trace, "wb") as out_et:
-        decodeMessage(orig_et, global_metadata)
-        encodeMessage(out_et, global_metadata)
-        while decodeMessage(orig_et, node):
-            if node.type == COMM_COLL_NODE:
-                for attr in node.attr:
-                    if attr.name != "pg_name":
-                        continue
+        xpu_map (List[int]): Physical XPU IDs indexed by trace-local XPU ID.
+    """
+    attr = ChakraAttr()
+    # Same varint32 length-delimited framing as protolib, but the whole trace is
+    # read in one go and written in large chunks instead of one file call per message.
+    with open(orig_trace, "rb") as orig_et:
+        data = memoryview(orig_et.read())
+    out = bytearray()
+    data_len = len(data)
+    num_xpus = len(xpu_map)
+    # Bind hot-loop globals and lookups to locals once per file.
+    decode_varint32 = _DecodeVarint32
+    decode_varint = _DecodeVarint
+    skip_field = _skip_field
+    peek_node_type = _peek_node_type
+    peek_attr_name = _peek_attr_name
+    comm_node_types = COMM_NODE_TYPES
+    get_global_cg = comm_group_map.get
+
+    with open(out_trace, "wb") as out_et:
+        # The global metadata needs no translation, copy its frame verbatim.
+        size, pos = _DecodeVarint32(data, 0)
+        pos += size
+        out += data[:pos]
+
+        while pos < data_len:
+            # Flush in bounded chunks so very large traces do not sit in memory twice.
+            if len(out) >= FLUSH_BYTES:
+                out_et.write(out)
+                out.clear()
+            frame_start = pos
+            size, pos = decode_varint32(data, pos)
+            # A zero-length message terminates the trace, as in protolib.decodeMessage.
+            if size == 0:
+                break
+            end = pos + size
+            # Only comm nodes are translated, the rest pass through as is.
+            node_type = peek_node_type(data, pos, end)
+            if node_type not in comm_node_types:
+                out += data[frame_start:end]
+                pos = end
+                continue
+
+            # Walk the node's top-level fields and re-encode only the attrs that need
+            # translation. Everything in between is spliced through from the input.
+            attr_names = TRANSLATED_ATTRS[node_type]
+            node_bytes = bytearray()
+            node_start = copied = pos
+            while pos < end:
+                field_start = pos
+                tag, pos = decode_varint(data, pos)
+                if tag != ATTR_TAG:
+                    pos = skip_field(data, pos, tag & 0x7)
+                    continue
+                length, attr_start = decode_varint(data, pos)
+                pos = attr_start + length
+                if peek_attr_name(data, attr_start, pos) not in attr_names:
+                    continue
+
+                attr.ParseFromString(data[attr_start:pos])
+                if node_type == COMM_COLL_NODE:
                     pg_name_str = attr.string_val
-                    if pg_name_str not in comm_group_map:
+                    global_cg_id = get_global_cg(pg_name_str)
+                    if global_cg_id is None:
                         raise ValueError(
                             f"pg_name {pg_name_str} not found in comm_group_map, trace: {orig_trace}"
                         )
-                    attr.string_val = comm_group_map[pg_name_str]
-
-            elif node.type == COMM_RECV_NODE or node.type == COMM_SEND_NODE:
-                for attr in node.attr:
-                    if attr.name not in ["comm_src", "comm_dst"]:
-                        continue
-                    local_xpu_key = f"{trace_name}-{attr.int32_val}"
-                    if local_xpu_key not in placement_map:
+                    attr.string_val = global_cg_id
+                else:
+                    # Dispatch on the populated oneof member, so an int64 (or other
+                    # integer) peer ID is remapped in place instead of reading int32_val
+                    # as 0.
+                    value_field = attr.WhichOneof("value")
+                    if value_field not in XPU_ID_FIELDS:
+                        raise ValueError(
+                            f"{attr.name} holds {value_field}, expected an integer XPU ID, "
+                            f"trace: {orig_trace}"
+                        )
+                    local_xpu_id = getattr(attr, value_field)
+                    xpu_id = xpu_map[local_xpu_id] if 0 <= local_xpu_id < num_xpus else None
+                    if xpu_id is None:
                         raise ValueError(
-                            f"{local_xpu_key} not found in placement_map, trace: {orig_trace}"
+                            f"{trace_name}-{local_xpu_id} not found in placement_map, trace: {orig_trace}"
                         )
-                    attr.int32_val = placement_map[local_xpu_key]
+                    setattr(attr, value_field, xpu_id)
 
-            encodeMessage(out_et, node)
+                payload = attr.SerializeToString()
+                node_bytes += data[copied:field_start]
+                node_bytes += ATTR_TAG_BYTES
+                node_bytes += _VarintBytes(len(payload))
+                node_bytes += payload
+                copied = pos
+            if copied == node_start:
+                # None of the node's attrs needed translation, keep the original frame.
+                out += data[frame_start:end]
+                continue
+            node_bytes += data[copied:end]
+
+            out += _VarintBytes(len(node_bytes))
+            out += node_bytes
+        out_et.write(out)
 
 
-def merge_traces(input_path, traces, output_path, placement_map):
+def _lookup_xpu(xpu_map, trace_name, local_xpu_id, source):
+    """
+    Returns the physical XPU ID of a job-local XPU ID, raising if the placement has
+    no entry for it (out of range or a hole left as None).
+    """
+    xpu_id = xpu_map[local_xpu_id] if 0 <= local_xpu_id < len(xpu_map) else None
+    if xpu_id is None:
+        raise ValueError(f"{trace_name}-{local_xpu_id} not found in placement_map, {source}")
+    return xpu_id
+
+
+def _translate_worker(task):
+    """
+    Process pool entry point, unpacks a task tuple for translate_chakra_pb().
+    """
+    translate_chakra_pb(*task)
+
+
+def merge_traces(input_path, traces, output_path, placement):
     """
     Merges multiple Chakra traces into a single trace based on the provided placement map.
     Args:
         input_path (str): The folder containing the individual traces.
         traces (List[str]): List of trace names to merge.
         output_path (str): The folder to the merged trace.
-        placement_map (Dict[str, int]): job and XPU IDs to physical XPU IDs mapping.
+        placement (Dict[str, List[int]]): per-job physical XPU IDs, indexed by job-local
+            XPU ID. See parse_placement_indexed().
     """
     print(f"Merging traces from {input_path} into {output_path}")
     print(f"Traces to merge: {traces}")
     # A monotonically increasing index for global communication group IDs
-    cg_index = MonotonicCounter(0)
+    cg_index = itertools.count(0)
     # Mapping job-local XPU IDs in communication groups (pg_name) -> global XPU IDs
     global_comm_group_map = {}
+    # Per-file translation tasks. Each .et file is translated independently.
+    tasks = []
     for trace in traces:
         trace_path = os.path.join(input_path, trace)
         if not os.path.exists(trace_path):
@@ -123,33 +291,51 @@ def merge_traces(input_path, traces, output_path, placement_map):
         comm_group_path = os.path.join(trace_path, f"{trace}.json")
         if not os.path.isfile(comm_group_path):
             raise FileNotFoundError(f"comm_group config not found at {comm_group_path}")
+        # Job-local XPU ID -> physical XPU ID for this trace.
+        trace_xpu_map = placement.get(trace)
+        if trace_xpu_map is None:
+            raise KeyError(f"Trace {trace} not found in placement")
         # Throwaway trace-specific communication group ID map for trace translation.
         trace_cg_map = {}
         for local_cg_id, xpu_list in parse_comm_group(comm_group_path).items():
-            global_cg_id = str(cg_index.fetch())
+            global_cg_id = str(next(cg_index))
             trace_cg_map[local_cg_id] = global_cg_id
             global_comm_group_map[global_cg_id] = [
-                placement_map[f"{trace}-{int(local_xpu_id)}"] for local_xpu_id in xpu_list
+                _lookup_xpu(
+                    trace_xpu_map, trace, int(local_xpu_id), f"comm group: {comm_group_path}"
+                )
+                for local_xpu_id in xpu_list
             ]
 
-        # Iterate over all .et files in the trace directory and translate them.
-        for name in sorted(os.listdir(trace_path)):
-            if not name.endswith(".et"):
-                continue
-            local_xpu_id = name.split(".")[-2]
-            global_xpu_id = placement_map[f"{trace}-{local_xpu_id}"]
-            translate_chakra_pb(
-                orig_trace=os.path.join(trace_path, name),
-                out_trace=os.path.join(output_path, f"trace.{global_xpu_id}.et"),
-                trace_name=trace,
-                comm_group_map=trace_cg_map,
-                placement_map=placement_map,
+        # Collect all .et files in the trace directory for translation.
+        with os.scandir(trace_path) as it:
+            et_entries = sorted(
+                (entry for entry in it if entry.is_file() and entry.name.endswith(".et")),
+                key=lambda entry: entry.name,
+            )
+        for entry in et_entries:
+            local_xpu_id = entry.name.rsplit(".", 2)[-2]
+            global_xpu_id = _lookup_xpu(
+                trace_xpu_map, trace, int(local_xpu_id), f"trace: {entry.path}"
+            )
+            tasks.append(
+                (
+                    entry.path,
+                    os.path.join(output_path, f"trace.{global_xpu_id}.et"),
+                    trace,
+                    trace_cg_map,
+                    trace_xpu_map,
+                )
             )
 
+    # Translate all traces in parallel, one .et file per task.
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for _ in executor.map(_translate_worker, tasks, chunksize=4):
+            pass
+
     # Dump the merged communication group config.
     merged_comm_group_path = os.path.join(output_path, "comm_group.json")
-    with open(merged_comm_group_path, "w") as f:
-        json.dump(global_comm_group_map, f, indent=2)
+    dump_json(global_comm_group_map, merged_comm_group_path)
 
 
 if __name__ == "__main__":
@@ -172,7 +358,15 @@ if __name__ == "__main__":
     traces = sorted(args.traces)
     output_path = args.output
 
+    # Only the pg_name/comm_src/comm_dst attrs of comm nodes are parsed and
+    # re-encoded, which is still noticeably slower on the pure-Python backend.
+    if api_implementation.Type() == "python":
+        print(
+            "WARNING: protobuf is using the pure-Python backend, trace merging will be "
+            "slow. Install protobuf>=4.21 to get the upb backend."
+        )
+
     # Parse the json config for job placement.
-    placement_map = parse_placement(args.placement)
+    placement = parse_placement_indexed(args.placement)
 
-    merge_traces(input_path, traces, output_path, placement_map)
+    merge_traces(input_path, traces, output_path, placement)
@@ -1,6 +1,6 @@
 import argparse
 import json
-from natsort import natsorted
+import re
 from math import prod
 from create_jobspec import parse_jobspec
 from placement_lib import (
@@ -12,9 +12,22 @@ from placement_lib import (
 )
 
 
+# Splits digit runs out of a job name for natural ordering.
+_DIGITS_RE = re.compile(r"(\d+)")
+
+
+def _natural_key(text):
+    """
+    Splits text into alternating str/int runs so that e.g. J2 sorts before J10.
+    """
+    return [int(tok) if tok.isdigit() else tok for tok in _DIGITS_RE.split(text)]
+
+
 def place_with_policy(torus_dims, jobs, policy, block_dims, traffic_dir):
     """
     Generate job placement with a policy.
+    Returns a job-major placement: job name -> array of physical XPU IDs indexed by
+    job-local XPU ID.
     """
     placement = {}
     W, L, H = torus_dims
@@ -34,20 +47,29 @@ def place_with_policy(torus_dims, jobs, policy, block_dims, traffic_dir):
 
     for name, [shape, _] in jobs.items():
         mapping = policy_impl.allocate(name, shape)
-        if not mapping:
+        if mapping is None:
             raise RuntimeError(
                 f"[{policy}] Failed to place job {name} with shape {shape}."
             )
-        for j_idx in sorted(mapping.keys()):
-            placement[f"{name}-{j_idx}"] = mapping[j_idx]
+        placement[name] = mapping
 
     return placement
 
 
 def dump(placement, output_path):
-    placement = dict(natsorted(placement.items()))
+    """
+    Writes a job-major placement as a flat JSON object keyed "<job name>-<XPU ID>".
+    Jobs are ordered naturally (J2 before J10) and XPU IDs numerically. The entries
+    are formatted straight from the per-job mappings, with a 4-space indent.
+    """
+    lines = []
+    for name in sorted(placement, key=_natural_key):
+        lines.extend(
+            f"    {json.dumps(f'{name}-{j_idx}')}: {xpu_id}"
+            for j_idx, xpu_id in enumerate(placement[name].tolist())
+        )
     with open(output_path, "w") as f:
-        json.dump(placement, f, indent=4)
+        f.write("{\n" + ",\n".join(lines) + "\n}" if lines else "{}")
 
 
 if __name__ == "__main__":
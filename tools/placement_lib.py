@@ -1,10 +1,8 @@
 import math
-import itertools
 import random
 import subprocess
 import numpy as np
 from pathlib import Path
-from hilbertcurve.hilbertcurve import HilbertCurve
 
 
 def coord_to_linear_index(x, y, z, dims):
@@ -30,6 +28,69 @@ def linear_index_to_coord(index, dims):
     return x, y, z
 
 
+def _block_indices(W, L, H, BX, BY, BZ):
+    """
+    Splits a WxLxH grid into BXxBYxBZ blocks of plane-major linear indices.
+    Returns an array with one row per block, blocks ordered Z-major like the
+    grid itself and nodes within a block ordered X fastest. Blocks that stick
+    out of the grid are padded with -1.
+    """
+    PW, PL, PH = -(-W // BX) * BX, -(-L // BY) * BY, -(-H // BZ) * BZ
+    grid = np.full((PH, PL, PW), -1, dtype=np.int64)
+    grid[:H, :L, :W] = np.arange(W * L * H).reshape(H, L, W)
+    return (
+        grid.reshape(PH // BZ, BZ, PL // BY, BY, PW // BX, BX)
+        .transpose(0, 2, 4, 1, 3, 5)
+        .reshape(-1, BX * BY * BZ)
+    )
+
+
+def _hilbert_exchange(X, i, q):
+    """
+    One Skilling step on the transposed coordinates X for bit q and axis i:
+    invert the low bits of X[0] if bit q of X[i] is set, else exchange them.
+    """
+    low = q - 1
+    bit_set = (X[i] & q) != 0
+    t = (X[0] ^ X[i]) & low
+    # X[i] first: for i == 0 the exchange branch is a no-op.
+    X[i] = np.where(bit_set, X[i], X[i] ^ t)
+    X[0] = np.where(bit_set, X[0] ^ low, X[0] ^ t)
+
+
+def _hilbert_distances(points, p):
+    """
+    Vectorized Hilbert index of each row of the (M, n) integer array points on a
+    curve of 2^p cells per side. Same algorithm (Skilling's transpose method) and
+    bit order as hilbertcurve.HilbertCurve.distances_from_points.
+    """
+    n = points.shape[1]
+    X = [points[:, i].astype(np.int64) for i in range(n)]
+    m = 1 << (p - 1)
+    # Inverse undo excess work.
+    q = m
+    while q > 1:
+        for i in range(n):
+            _hilbert_exchange(X, i, q)
+        q >>= 1
+    # Gray encode.
+    for i in range(1, n):
+        X[i] ^= X[i - 1]
+    t = np.zeros_like(X[0])
+    q = m
+    while q > 1:
+        t = np.where((X[n - 1] & q) != 0, t ^ (q - 1), t)
+        q >>= 1
+    for i in range(n):
+        X[i] ^= t
+    # Interleave the transposed bits, most significant bit of X[0] first.
+    h = np.zeros_like(X[0])
+    for b in range(p):
+        for i in range(n):
+            h |= ((X[i] >> b) & 1) << (b * n + n - 1 - i)
+    return h
+
+
 class FirstFit:
     """
     First-Fit placement algorithm with 3D integral volume optimization.
@@ -40,47 +101,52 @@ class FirstFit:
         self.W, self.L, self.H = W, L, H
         # Grid stores occupancy: 0 = free, 1 = occupied
         self.grid = np.zeros((W, L, H), dtype=int)
-
-    def _get_integral_volume(self):
-        """Creates a 3D prefix sum for O(1) volume checks."""
-        return self.grid.cumsum(axis=0).cumsum(axis=1).cumsum(axis=2)
-
-    def _is_free(self, integral, start, size):
-        """Standard inclusion-exclusion for 3D range sum."""
-        x, y, z = start
-        A, B, C = size
-        x1, y1, z1 = x + A - 1, y + B - 1, z + C - 1
-
-        def get_val(i, j, k):
-            if i < 0 or j < 0 or k < 0:
-                return 0
-            return integral[i, j, k]
-
-        res = (
-            get_val(x1, y1, z1)
-            - get_val(x - 1, y1, z1)
-            - get_val(x1, y - 1, z1)
-            - get_val(x1, y1, z - 1)
-            + get_val(x - 1, y - 1, z1)
-            + get_val(x - 1, y1, z - 1)
-            + get_val(x1, y - 1, z - 1)
-            - get_val(x - 1, y - 1, z - 1)
+        # 3D prefix sum of the grid, padded with a zero plane on each low face:
+        # prefix[i, j, k] is the occupied count of grid[:i, :j, :k]. It is kept up to
+        # date by _mark_block() instead of being rebuilt on every query.
+        self.prefix = np.zeros((W + 1, L + 1, H + 1), dtype=int)
+
+    def _mark_block(self, x0, y0, z0, A, B, C):
+        """Marks a free AxBxC block at (x0, y0, z0) occupied and updates the prefix sum."""
+        self.grid[x0 : x0 + A, y0 : y0 + B, z0 : z0 + C] = 1
+        # prefix[i, j, k] gains the overlap of grid[:i, :j, :k] with the block, which
+        # is separable into per-axis overlaps.
+        dx = np.minimum(np.arange(1, self.W - x0 + 1), A)
+        dy = np.minimum(np.arange(1, self.L - y0 + 1), B)
+        dz = np.minimum(np.arange(1, self.H - z0 + 1), C)
+        self.prefix[x0 + 1 :, y0 + 1 :, z0 + 1 :] += (
+            dx[:, None, None] * dy[None, :, None] * dz[None, None, :]
         )
-        return res == 0
 
     def find_placement(self, A, B, C):
-        """Scans for the first origin that fits the AxBxC block."""
-        integral = self._get_integral_volume()
-        for z in range(self.H - C + 1):
-            for y in range(self.L - B + 1):
-                for x in range(self.W - A + 1):
-                    if self._is_free(integral, (x, y, z), (A, B, C)):
-                        return (x, y, z)
-        return None
+        """Scans for the first origin (Z -> Y -> X order) that fits the AxBxC block."""
+        if A > self.W or B > self.L or C > self.H:
+            return None
+        # Evaluate the inclusion-exclusion box sum for all origins at once.
+        # used[x, y, z] is the occupied count of the block at (x, y, z).
+        P = self.prefix
+        used = (
+            P[A:, B:, C:]
+            - P[:-A, B:, C:]
+            - P[A:, :-B, C:]
+            - P[A:, B:, :-C]
+            + P[:-A, :-B, C:]
+            + P[:-A, B:, :-C]
+            + P[A:, :-B, :-C]
+            - P[:-A, :-B, :-C]
+        )
+        # The first True of the Z -> Y -> X flattened free mask is the first fit.
+        free = (used == 0).transpose(2, 1, 0)
+        first = int(free.ravel().argmax())
+        z, y, x = np.unravel_index(first, free.shape)
+        if not free[z, y, x]:
+            return None
+        return (int(x), int(y), int(z))
 
     def allocate(self, name, shape):
         """
-        Allocates job and returns {job_linear_index: torus_linear_index}
+        Allocates job and returns an array mapping job_linear_index -> torus_linear_index,
+        or None if the job does not fit.
         """
         A, B, C = shape
         origin = self.find_placement(A, B, C)
@@ -89,27 +155,17 @@ class FirstFit:
             return None
 
         x0, y0, z0 = origin
-        mapping = {}
-
-        # Nested loops ordered by slowest to fastest changing (Z -> Y -> X)
-        for c in range(C):
-            for b in range(B):
-                for a in range(A):
-                    # 1. Physical coordinates in the WxLxH torus
-                    px, py, pz = x0 + a, y0 + b, z0 + c
-
-                    # 2. Update occupancy grid
-                    self.grid[px, py, pz] = 1
-
-                    # 3. Calculate linear indices (X is fastest)
-                    job_idx = coord_to_linear_index(a, b, c, (A, B, C))
-                    torus_idx = coord_to_linear_index(
-                        px, py, pz, (self.W, self.L, self.H)
-                    )
-
-                    mapping[job_idx] = torus_idx
-
-        return mapping
+        # Update occupancy grid
+        self._mark_block(x0, y0, z0, A, B, C)
+
+        # Physical coordinates of every job node, ordered Z -> Y -> X (X fastest) so
+        # that position i in the flattened array is job linear index i, which is the
+        # returned mapping.
+        c, b, a = np.indices((C, B, A))
+        torus_idx = coord_to_linear_index(
+            x0 + a, y0 + b, z0 + c, (self.W, self.L, self.H)
+        )
+        return torus_idx.ravel()
 
 
 class SpaceFillingCurve:
@@ -120,55 +176,44 @@ class SpaceFillingCurve:
 
     def __init__(self, W, L, H):
         self.W, self.L, self.H = W, L, H
-        # Grid stores occupancy: 0 = free, 1 = occupied
-        self.grid = np.zeros((W, L, H), dtype=int)
 
         # Calculate iterations P such that 2^P >= max(W, L, H)
-        P = math.ceil(math.log2(max(W, L, H)))
+        self.P = math.ceil(math.log2(max(W, L, H)))
+        if self.P <= 0:
+            raise ValueError(f"Hilbert curve needs a dimension > 1, got ({W}, {L}, {H})")
         # Torus dimension is 3D.
-        torus_dim = 3
-        # Initialize Hilbert Curve with multiprocessing.
-        self.sfc = HilbertCurve(P, torus_dim)
+        self.torus_dim = 3
 
-    def _fetch_availability(self):
-        """
-        Returns a sorted list of SFC indices for all free nodes in the grid.
-        """
-        # Get coordinates of free nodes
-        free_coords = np.argwhere(self.grid == 0)
-        # Get Hilbert indices
-        distances = self.sfc.distances_from_points(free_coords)
-        # Return sorted list
-        return sorted(distances)
+        # Hilbert indices never change, only which nodes are free does. Encode
+        # every node once and keep the torus linear indices in curve order.
+        x, y, z = (axis.ravel() for axis in np.indices((W, L, H)))
+        distances = _hilbert_distances(np.stack((x, y, z), axis=1), self.P)
+        order = np.argsort(distances)
+        self.sfc_linear = coord_to_linear_index(x, y, z, (W, L, H))[order]
+        # Occupancy aligned with sfc_linear: True = free, False = occupied.
+        self.free_mask = np.ones(W * L * H, dtype=bool)
 
     def allocate(self, name, shape):
         """
-        Allocates job and returns {job_linear_index: torus_linear_index}
+        Allocates job and returns an array mapping job_linear_index -> torus_linear_index,
+        or None if the job does not fit.
         """
         A, B, C = shape
         # N is the total number of nodes required for the job
         N = A * B * C
 
-        # Get all available Hilbert indices
-        available_indices = self._fetch_availability()
-        if len(available_indices) < N:
+        # Positions along the curve of all free nodes, in curve order.
+        free_pos = np.flatnonzero(self.free_mask)
+        if len(free_pos) < N:
             return None
 
-        # Allocate the first N available nodes that are closest together
-        # and convert back to coordinates.
-        alloc_coords = self.sfc.points_from_distances(available_indices[:N])
-
-        mapping = {}
+        # Allocate the first N available nodes that are closest together.
+        selected = free_pos[:N]
+        # Mark as occupied
+        self.free_mask[selected] = False
         # Job-internal node index is already linearized as i. It maps to the
-        # linearized torus index from the allocated coordinates.
-        for i in range(N):
-            x, y, z = alloc_coords[i]
-            # Mark as occupied
-            self.grid[x, y, z] = 1
-            # Map to torus index
-            mapping[i] = coord_to_linear_index(x, y, z, (self.W, self.L, self.H))
-
-        return mapping
+        # linearized torus index of the i-th selected node along the curve.
+        return self.sfc_linear[selected]
 
 
 class L1Clustering:
@@ -179,68 +224,64 @@ class L1Clustering:
 
     def __init__(self, W, L, H):
         self.W, self.L, self.H = W, L, H
-        self.dims = np.array([W, L, H])
         # Grid stores occupancy: 0 = free, 1 = occupied
         self.grid = np.zeros((W, L, H), dtype=int)
 
-        # Precompute coordinates for distance calculations
+        # Precompute coordinates for distance calculations, one flat array per axis
+        # indexed by the flattened grid index.
         x, y, z = np.indices((W, L, H))
-        self.coords = np.stack((x, y, z), axis=-1).reshape(-1, 3)
+        self.xs, self.ys, self.zs = x.ravel(), y.ravel(), z.ravel()
+        # Per-dimension ring distance tables, e.g. dx[a, b] is the wrap-around
+        # distance between x = a and x = b.
+        self.dx, self.dy, self.dz = (self._ring_distance(n) for n in (W, L, H))
 
-    def _get_torus_distance(self, center_coord):
-        diff = np.abs(self.coords - center_coord)
-        dist_per_dim = np.minimum(diff, self.dims - diff)
-        return np.sum(dist_per_dim, axis=1)
+    @staticmethod
+    def _ring_distance(n):
+        ax = np.arange(n)
+        diff = np.abs(ax[:, None] - ax[None, :])
+        return np.minimum(diff, n - diff)
 
     def allocate(self, name, shape):
         A, B, C = shape
         k = A * B * C
 
-        # Find idle nodes
-        idle_indices = np.where(self.grid.flatten() == 0)[0]
+        # Find idle nodes. ravel() is a view of the grid, so this is a single pass.
+        idle_mask = self.grid.ravel() == 0
+        idle_indices = np.flatnonzero(idle_mask)
 
         if len(idle_indices) < k:
             return None
 
-        best_cost = float("inf")
-        best_selection = None
-
         # Optimization: check subset of idle nodes
         step = max(1, len(idle_indices) // 100)
+        centers = idle_indices[::step]
+        center_x, center_y, center_z = self.xs[centers], self.ys[centers], self.zs[centers]
+
+        # Distances from every candidate center (rows) to every idle node (columns),
+        # built from the per-dimension tables. Accumulate into the first gather
+        # in place so no extra (centers, idle) temporaries are allocated.
+        idle_x, idle_y, idle_z = self.xs[idle_mask], self.ys[idle_mask], self.zs[idle_mask]
+        distances = self.dx[center_x[:, None], idle_x]
+        distances += self.dy[center_y[:, None], idle_y]
+        distances += self.dz[center_z[:, None], idle_z]
+
+        # Find k closest idle nodes for each center
+        if len(idle_indices) == k:
+            k_closest_local_idx = np.broadcast_to(np.arange(k), (len(centers), k))
+        else:
+            k_closest_local_idx = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        costs = np.take_along_axis(distances, k_closest_local_idx, axis=1).sum(axis=1)
+
+        # argmin picks the first center with the lowest cost, like a strict < scan.
+        best = np.argmin(costs)
+        best_selection = idle_indices[k_closest_local_idx[best]]
 
-        for center_idx in idle_indices[::step]:
-            center_coord = self.coords[center_idx]
-            distances = self._get_torus_distance(center_coord)
-
-            # We only care about distances to idle nodes
-            idle_distances = distances[idle_indices]
-
-            # Find k closest idle nodes
-            if len(idle_distances) == k:
-                k_closest_local_idx = np.arange(k)
-            else:
-                k_closest_local_idx = np.argpartition(idle_distances, k - 1)[:k]
-
-            current_cost = np.sum(idle_distances[k_closest_local_idx])
-
-            if current_cost < best_cost:
-                best_cost = current_cost
-                best_selection = idle_indices[k_closest_local_idx]
-
-        if best_selection is None:
-            return None
-
-        mapping = {}
         # Sort selection to have deterministic mapping
-        best_selection = sorted(best_selection)
+        best_selection = np.sort(best_selection)
 
-        for i, idx in enumerate(best_selection):
-            x, y, z = self.coords[idx]
-            self.grid[x, y, z] = 1
-            torus_idx = coord_to_linear_index(x, y, z, (self.W, self.L, self.H))
-            mapping[i] = int(torus_idx)
-
-        return mapping
+        x, y, z = self.xs[best_selection], self.ys[best_selection], self.zs[best_selection]
+        self.grid[x, y, z] = 1
+        return coord_to_linear_index(x, y, z, (self.W, self.L, self.H))
 
 
 class BlockRandom:
@@ -260,22 +301,8 @@ class BlockRandom:
                 f"by block dimensions ({BX}, {BY}, {BZ})"
             )
 
-        # Initialize torus blocks
-        self.torus_blocks = []
-        for z_start, y_start, x_start in itertools.product(
-            range(0, H, self.BZ), range(0, L, self.BY), range(0, W, self.BX)
-        ):
-            block = []
-            for z, y, x in itertools.product(
-                range(z_start, z_start + self.BZ),
-                range(y_start, y_start + self.BY),
-                range(x_start, x_start + self.BX),
-            ):
-                # Ensure we don't go out of bounds
-                if x < W and y < L and z < H:
-                    block.append(coord_to_linear_index(x, y, z, (W, L, H)))
-            if block:
-                self.torus_blocks.append(block)
+        # Initialize torus blocks, the torus divides evenly so there is no padding.
+        self.torus_blocks = _block_indices(W, L, H, BX, BY, BZ).tolist()
 
     def allocate(self, name, shape):
         A, B, C = shape
@@ -286,22 +313,11 @@ class BlockRandom:
                 f"larger than job dimensions ({A}, {B}, {C})"
             )
 
-        job_blocks = []
-        for z_start, y_start, x_start in itertools.product(
-            range(0, C, self.BZ), range(0, B, self.BY), range(0, A, self.BX)
-        ):
-            block = []
-            for z, y, x in itertools.product(
-                range(z_start, z_start + self.BZ),
-                range(y_start, y_start + self.BY),
-                range(x_start, x_start + self.BX),
-            ):
-                # Check bounds to avoid overlapping indices or invalid nodes
-                if x < A and y < B and z < C:
-                    block.append(coord_to_linear_index(x, y, z, (A, B, C)))
-
-            if block:
-                job_blocks.append(block)
+        # Edge blocks of a job that does not divide evenly are partial, drop padding.
+        job_blocks = [
+            [j_node for j_node in block if j_node >= 0]
+            for block in _block_indices(A, B, C, self.BX, self.BY, self.BZ).tolist()
+        ]
 
         if len(job_blocks) > len(self.torus_blocks):
             raise RuntimeError(
@@ -309,15 +325,14 @@ class BlockRandom:
                 f"to allocate job blocks ({len(job_blocks)})"
             )
 
-        mapping = {}
+        mapping = np.empty(A * B * C, dtype=np.int64)
         for j_block in job_blocks:
             # Pick random torus block
             ptr = random.randrange(len(self.torus_blocks))
             t_block = self.torus_blocks.pop(ptr)
 
-            # Map nodes
-            for j_node, t_node in zip(j_block, t_block):
-                mapping[j_node] = t_node
+            # Map nodes, a partial job block takes the leading nodes of the torus block.
+            mapping[j_block] = t_block[: len(j_block)]
 
         return mapping
 
@@ -346,13 +361,11 @@ class TopoMatch:
         traffic_file = str(self.traffic_dir / name / "traffic.mat")
         solution_file = str(self.workdir / f"{name}.sol")
 
-        # Find free nodes and write to file.
-        free_indices = sorted([
-            coord_to_linear_index(x, y, z, (self.W, self.L, self.H))
-            for x, y, z in np.argwhere(self.grid == 0)
-        ])
+        # Find free nodes and write to file. The (H, L, W) transposed view flattens
+        # to z * L * W + y * W + x, so its flat indices are the sorted linear indices.
+        free_indices = np.flatnonzero(self.grid.T == 0)
         with open(binding_file, "w") as f:
-            f.write(" ".join(map(str, free_indices)))
+            f.write(" ".join(map(str, free_indices.tolist())))
 
         # Block until the command returns
         subprocess.run(f"/usr/local/bin/mapping -t {topo_file} -b {binding_file} "
@@ -362,12 +375,9 @@ class TopoMatch:
         if not Path(solution_file).exists():
             raise RuntimeError(f"Placement for job {name} not generated.")
         with open(solution_file, "r") as f:
-            sol_mapping = [int(x) for x in f.read().strip().split(",")]
+            mapping = np.array([int(x) for x in f.read().strip().split(",")], dtype=np.int64)
 
-        mapping = {}
-        for i, idx in enumerate(sol_mapping):
-            x, y, z = linear_index_to_coord(idx, (self.W, self.L, self.H))
-            self.grid[x, y, z] = 1
-            mapping[i] = idx
+        x, y, z = linear_index_to_coord(mapping, (self.W, self.L, self.H))
+        self.grid[x, y, z] = 1
 
         return mapping
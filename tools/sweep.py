@@ -7,8 +7,15 @@ import os
 import json
 import re
 import csv
+import functools
 from sys import stdout
-from build_torus import generate_torus_links, model_contention
+from build_torus import (
+    generate_torus_links,
+    model_contention,
+    write_torus_topology_file,
+)
+
+_CYCLES_RE = re.compile(r"finished, (\d+) cycles")
 
 
 def extract_cycles(log_string: str) -> int | None:
@@ -21,15 +28,20 @@ def extract_cycles(log_string: str) -> int | None:
     Returns:
         The extracted cycle number as an integer, or None if not found.
     """
-    pattern = r"finished, (\d+) cycles"
-    match = re.search(pattern, log_string)
-    if match:
-        return int(match.group(1))
-
-    return None
+    match = _CYCLES_RE.search(log_string)
+    return int(match.group(1)) if match else None
 
 
-def run_helper(coll_size: str, use_ns3: bool):
+def run_helper(coll_size: str, use_ns3: bool, run_dir: str) -> int:
+    """
+    Runs the simulator for one sweep point and returns the largest cycle count
+    it reports. Output is scanned line by line as it is produced rather than
+    buffered in full.
+    Args:
+        coll_size (str): Collective size of the trace to run, e.g. "1MB".
+        use_ns3 (bool): Whether to use NS3 for simulation.
+        run_dir (str): Per-run folder holding the comm group and network configs.
+    """
     BASE_DIR = "/app"
     TRACE_DIR = os.path.normpath(
         os.path.join(BASE_DIR, f"examples/sweep/allreduce_{coll_size}")
@@ -47,17 +59,37 @@ def run_helper(coll_size: str, use_ns3: bool):
         f"--workload-configuration={TRACE_DIR}/trace "
         f"--remote-memory-configuration={INPUT_DIR}/RemoteMemory.json "
         f"--system-configuration={INPUT_DIR}/sys.json "
-        f"--comm-group-configuration={INPUT_DIR}/comm_group.json "
+        f"--comm-group-configuration={run_dir}/comm_group.json "
     )
     if use_ns3:
         cmd += (
-            f"--logical-topology-configuration={INPUT_DIR}/logical_network.json "
-            f"--network-configuration={INPUT_DIR}/ns3_config.txt"
+            f"--logical-topology-configuration={run_dir}/logical_network.json "
+            f"--network-configuration={run_dir}/ns3_config.txt"
         )
     else:
-        cmd += f"--network-configuration={INPUT_DIR}/network.yml"
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True, check=True)
-    return result
+        cmd += f"--network-configuration={run_dir}/network.yml"
+    max_cycles = 0
+    with subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, text=True) as proc:
+        for line in proc.stdout:
+            cycles = extract_cycles(line)
+            if cycles is not None and cycles > max_cycles:
+                max_cycles = cycles
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+    return max_cycles
+
+
+@functools.lru_cache(maxsize=None)
+def ring_links(ring_size: int, bandwidth: str, latency: str):
+    """
+    Memoized generate_torus_links() for a 1D ring. The link layout only depends
+    on these arguments, while a sweep reuses each ring size for many (N, M)
+    points. Links are returned as a tuple so the cached copy cannot be mutated.
+    """
+    header_line1, header_line2, links = generate_torus_links(
+        [ring_size], bandwidth, latency
+    )
+    return header_line1, header_line2, tuple(links)
 
 
 def gen_comm_group(folder_path: str, ring_size: int):
@@ -74,6 +106,35 @@ def gen_comm_group(folder_path: str, ring_size: int):
         json.dump(comm_group, f, indent=2)
 
 
+def gen_ns3_config(folder_path: str, template_path: str):
+    """
+    Generates an ns-3 config file pointing at the topology file and output files
+    in the given folder, so that concurrent runs do not share any files.
+    Args:
+        folder_path (str): The directory where the file will be created.
+        template_path (str): The ns3_config.txt to copy all other settings from.
+    """
+    per_run_keys = {
+        "TOPOLOGY_FILE",
+        "TRACE_OUTPUT_FILE",
+        "FCT_OUTPUT_FILE",
+        "PFC_OUTPUT_FILE",
+        "QLEN_MON_FILE",
+    }
+    lines = []
+    # Keep the template's line endings untouched.
+    with open(template_path, newline="") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 2 and fields[0] in per_run_keys:
+                eol = line[len(line.rstrip("\r\n")) :]
+                path = os.path.join(folder_path, os.path.basename(fields[1]))
+                line = f"{fields[0]} {path}{eol}"
+            lines.append(line)
+    with open(os.path.join(folder_path, "ns3_config.txt"), "w", newline="") as f:
+        f.writelines(lines)
+
+
 def gen_network_config(
     folder_path: str,
     ring_size: int,
@@ -102,19 +163,12 @@ def gen_network_config(
             json.dump(config, f, indent=4)
 
         # Generate physical network config for ns-3.
-        header_line1, header_line2, links = generate_torus_links(
-            [ring_size], f"{bandwidth_Gbps}Gbps", f"{latency_ns / 1e6}ms"
+        header_line1, header_line2, links = ring_links(
+            ring_size, f"{bandwidth_Gbps}Gbps", f"{latency_ns / 1e6}ms"
         )
-        contending_links = model_contention(links, n_links=N, m_jobs=M)
+        contending_links = model_contention(list(links), n_links=N, m_jobs=M)
         file_path = os.path.join(folder_path, "physical_network.txt")
-        with open(file_path, "w") as f:
-            f.write(header_line1 + "\n")
-            f.write(header_line2 + "\n")
-            f.write(
-                "\n".join(
-                    sorted(contending_links, key=lambda l: tuple(map(int, l.split()[:2])))
-                )
-            )
+        write_torus_topology_file(file_path, header_line1, header_line2, contending_links)
     else:
         # Generate network config for analytical backend.
         config = {
@@ -132,8 +186,8 @@ def sweep(use_ns3: bool):
     config_folder = "/app/examples/sweep/inputs"
     os.makedirs(config_folder, exist_ok=True)
 
-    sweep_results = []
-
+    # Generate every run's configs up front, each into its own folder.
+    runs = []
     ring_sizes = list(range(4, 33, 4)) + list(range(48, 257, 16))
     M_list = [2, 8]
     collective_sizes = ["1MB"]
@@ -143,9 +197,11 @@ def sweep(use_ns3: bool):
         for N, M, coll_size in base_cases + list(
             itertools.product(N_list, M_list, collective_sizes)
         ):
-            gen_comm_group(folder_path=config_folder, ring_size=size)
+            run_dir = os.path.join(config_folder, f"run_{size}_{N}_{M}_{coll_size}")
+            os.makedirs(run_dir, exist_ok=True)
+            gen_comm_group(folder_path=run_dir, ring_size=size)
             gen_network_config(
-                folder_path=config_folder,
+                folder_path=run_dir,
                 ring_size=size,
                 bandwidth_Gbps=400,
                 latency_ns=1000,
@@ -153,16 +209,27 @@ def sweep(use_ns3: bool):
                 N=N,
                 M=M,
             )
-            result = run_helper(coll_size=coll_size, use_ns3=use_ns3)
-            max_cycles = 0
-            for line in result.stdout.splitlines():
-                if "finished, " in line:
-                    cycles = extract_cycles(line)
-                    max_cycles = max(max_cycles, cycles if cycles is not None else 0)
-            sweep_results.append((size, N, M, coll_size, max_cycles))
+            if use_ns3:
+                gen_ns3_config(
+                    folder_path=run_dir,
+                    template_path=os.path.join(config_folder, "ns3_config.txt"),
+                )
+            runs.append(((size, N, M, coll_size), run_dir))
+
+    # Each run is an independent simulator process, so launch them concurrently.
+    cycles = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = {
+            executor.submit(run_helper, key[3], use_ns3, run_dir): key
+            for key, run_dir in runs
+        }
+        for future in concurrent.futures.as_completed(futures):
+            size, N, M, coll_size = key = futures[future]
+            cycles[key] = future.result()
             print(
-                f"Run S={size}, N={N}, M={M}, collective size={coll_size}: {max_cycles} cycles"
+                f"Run S={size}, N={N}, M={M}, collective size={coll_size}: {cycles[key]} cycles"
             )
+    sweep_results = [(*key, cycles[key]) for key, _ in runs]
 
     # Dump the sweep results to a CSV file
     header = [
@@ -1,10 +1,10 @@
 import argparse
 import os
-import json
 import bisect
 import numpy as np
 from collections import defaultdict
 
+from json_utils import load_json
 from chakra.src.third_party.utils.protolib import decodeMessage
 from chakra.schema.protobuf.et_def_pb2 import (
     Node as ChakraNode,
@@ -35,27 +35,20 @@ def process_trace(trace_path):
         decodeMessage(f, gm)
         node = ChakraNode()
         while decodeMessage(f, node):
+            if node.type != COMM_COLL_NODE and node.type != COMM_SEND_NODE:
+                continue
+            # Index the attributes once instead of scanning them per lookup.
+            attrs = {attr.name: attr for attr in node.attr}
+            size_attr = attrs.get("comm_size")
+            comm_size = size_attr.int64_val if size_attr is not None else 0
             if node.type == COMM_COLL_NODE:
-                pg_name = None
-                comm_size = 0
-                for attr in node.attr:
-                    if attr.name == "pg_name":
-                        pg_name = attr.string_val
-                    elif attr.name == "comm_size":
-                        comm_size = attr.int64_val
-                if pg_name is not None:
-                    coll_volumes[pg_name] += comm_size
-
-            elif node.type == COMM_SEND_NODE:
-                comm_dst = None
-                comm_size = 0
-                for attr in node.attr:
-                    if attr.name == "comm_dst":
-                        comm_dst = attr.int32_val
-                    elif attr.name == "comm_size":
-                        comm_size = attr.int64_val
-                if comm_dst is not None:
-                    send_volumes[comm_dst] += comm_size
+                pg_attr = attrs.get("pg_name")
+                if pg_attr is not None:
+                    coll_volumes[pg_attr.string_val] += comm_size
+            else:
+                dst_attr = attrs.get("comm_dst")
+                if dst_attr is not None:
+                    send_volumes[dst_attr.int32_val] += comm_size
 
     return coll_volumes, send_volumes
 
@@ -63,8 +56,9 @@ def process_trace(trace_path):
 def build_traffic_matrix(entries, num_nodes):
     matrix = np.zeros((num_nodes, num_nodes), dtype=int)
     # src and dst are integers, vol is in MB.
-    for src, dst, vol in entries:
-        matrix[src, dst] += vol
+    entries = np.asarray(entries, dtype=int).reshape(-1, 3)
+    # Unbuffered add so repeated (src, dst) pairs accumulate.
+    np.add.at(matrix, (entries[:, 0], entries[:, 1]), entries[:, 2])
     return matrix
 
 
@@ -80,31 +74,34 @@ def main():
     )
     args = parser.parse_args()
 
-    # Construct files as a list of tuples (N, filename)
+    # Construct files as a list of tuples (N, filename, path)
     files = []
     comm_group = {}
-    for f in os.listdir(args.trace_folder):
-        if f.endswith(".et"):
-            try:
-                n = int(f.split(".")[-2])
-            except (IndexError, ValueError):
-                n = -1
-            files.append((n, f))
-        if f.endswith(".json"):
-            with open(os.path.join(args.trace_folder, f), "r") as json_file:
-                comm_group = json.load(json_file)
+    with os.scandir(args.trace_folder) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            if entry.name.endswith(".et"):
+                try:
+                    n = int(entry.name.rsplit(".", 2)[-2])
+                except (IndexError, ValueError):
+                    n = -1
+                files.append((n, entry.name, entry.path))
+            elif entry.name.endswith(".json"):
+                comm_group = load_json(entry.path)
     files.sort()
 
+    # Sort each comm group's members once rather than per trace.
+    sorted_groups = {pg_name: sorted(members) for pg_name, members in comm_group.items()}
+
     traffic_entries = []
-    for n, filename in files:
-        coll_volumes, send_volumes = process_trace(
-            os.path.join(args.trace_folder, filename)
-        )
+    for n, _, path in files:
+        coll_volumes, send_volumes = process_trace(path)
 
         # print(f"Node {n}")
         if coll_volumes:
             for pg_name, volume in sorted(coll_volumes.items()):
-                next_node = find_next_wrap(sorted(comm_group[pg_name]), n)
+                next_node = find_next_wrap(sorted_groups[pg_name], n)
                 # print(
                 #     f"To {next_node} (PG {pg_name} [{comm_group[pg_name]}]): {volume / 1000000} MB"
                 # )
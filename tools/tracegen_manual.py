@@ -1,12 +1,14 @@
 import os
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 import math
-import json
 import csv
 from pathlib import Path
+import numpy as np
 from create_jobspec import parse_jobspec
+from json_utils import dump_json
 
-from chakra.src.third_party.utils.protolib import encodeMessage as encode_message
+from google.protobuf.internal.encoder import _VarintBytes
 from chakra.schema.protobuf.et_def_pb2 import (
     Node as ChakraNode,
     BoolList,
@@ -19,27 +21,151 @@ from chakra.schema.protobuf.et_def_pb2 import (
 )
 
 BYTES_IN_MB = 1_048_576
+# Wire tag of a Node.attr entry (length-delimited). attr is the last field of
+# Node, so an entry appended to a serialized node is the node's last attr.
+ATTR_TAG_BYTES = _VarintBytes(
+    (ChakraNode.DESCRIPTOR.fields_by_name["attr"].number << 3) | 2
+)
+
+
+def frame_message(message):
+    """
+    Serialize a message with its length prepended as a 32-bit varint, the same
+    framing as protolib.encodeMessage, so a whole trace can be written at once.
+    """
+    payload = message.SerializeToString()
+    return _VarintBytes(len(payload)) + payload
+
+
+def write_frames(path, frames):
+    """
+    Write the given frames to path with one writev() on a raw descriptor,
+    skipping the buffered file object and the concatenation of the frames.
+    An existing path is unlinked first: it may be a hard link to another NPU's
+    trace from an earlier run, which truncating in place would overwrite too.
+    """
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        written = os.writev(fd, frames)
+    finally:
+        os.close(fd)
+    if written != sum(len(frame) for frame in frames):
+        raise OSError(f"Short write to {path}: {written} bytes")
 
 
 def genSingleDummyTrace(output, name):
     job_path = output / name
     job_path.mkdir(parents=True, exist_ok=True)
-    with open(job_path / f"{name}.0.et", "wb") as et:
-        encode_message(et, GlobalMetadata(version="0.0.4"))
-        node1 = ChakraNode()
-        node1.id = 1
-        node1.name = "DummyNode"
-        node1.type = COMP_NODE
-        node1.duration_micros = 1
-        node1.attr.append(ChakraAttr(name="is_cpu_op", bool_val=False))
-        node1.attr.append(ChakraAttr(name="num_ops", int64_val=1))
-        node1.attr.append(ChakraAttr(name="tensor_size", int64_val=1))
-        encode_message(et, node1)
-    with open(job_path / f"{name}.json", "w") as f:
-        json.dump({}, f, indent=2)
-
-
-def gen_trace(output, name, shape, coll_sizes):
+    node1 = ChakraNode()
+    node1.id = 1
+    node1.name = "DummyNode"
+    node1.type = COMP_NODE
+    node1.duration_micros = 1
+    node1.attr.append(ChakraAttr(name="is_cpu_op", bool_val=False))
+    node1.attr.append(ChakraAttr(name="num_ops", int64_val=1))
+    node1.attr.append(ChakraAttr(name="tensor_size", int64_val=1))
+    write_frames(
+        job_path / f"{name}.0.et",
+        [frame_message(GlobalMetadata(version="0.0.4")), frame_message(node1)],
+    )
+    dump_json({}, job_path / f"{name}.json")
+
+
+def _group_ids(npu_id, shape):
+    """
+    Per-dim comm-group IDs of one NPU, or of every NPU if npu_id is an array.
+    Offsets keep IDs disjoint across dims so the merged comm_groups dict has
+    unique keys.
+    """
+    DP, TP, PP = shape
+    xc = npu_id % DP
+    yc = (npu_id // DP) % TP
+    zc = npu_id // (DP * TP)
+    return [
+        yc + zc * TP,                         # dim 0 (DP / X)
+        xc + zc * DP + (TP * PP),             # dim 1 (TP / Y)
+        xc + yc * DP + (TP * PP) + (DP * PP), # dim 2 (PP / Z)
+    ]
+
+
+def _link_trace(src, dst):
+    """
+    Hard-link dst to the already written trace src, replacing any existing dst.
+    Returns False if the filesystem does not support hard links.
+    """
+    try:
+        os.unlink(dst)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(src, dst)
+    except OSError:
+        return False
+    return True
+
+
+def _write_npu_traces(job_path, name, shape, gm_frame, sequence, npu_ids):
+    """
+    Write the .et file of every NPU in npu_ids. sequence holds the pre-framed
+    Compute nodes and (dim, serialized node) collectives built by gen_trace(),
+    the latter without their trailing pg_name attr.
+    """
+    coll_dims = [item[0] for item in sequence if not isinstance(item, bytes)]
+    # Every member of a comm group shares the same collective frame, so only
+    # the first NPU of each group pays for building it.
+    coll_frames = {}
+    # NPUs in the same groups on every dim (e.g. all NPUs of a 1D job) have
+    # identical traces. Those are hard-linked to the first one written.
+    written = {}
+    for npu_id in npu_ids:
+        group_ids = _group_ids(npu_id, shape)
+        path = job_path / f"{name}.{npu_id}.et"
+        trace_key = tuple(group_ids[dim] for dim in coll_dims)
+        first_path = written.get(trace_key)
+        if first_path is not None and _link_trace(first_path, path):
+            continue
+
+        frames = [gm_frame]
+        for item in sequence:
+            if isinstance(item, bytes):
+                frames.append(item)
+                continue
+            dim, coll = item
+            gid = group_ids[dim]
+            frame = coll_frames.get(gid)
+            if frame is None:
+                pg_attr = ChakraAttr(name="pg_name", string_val=str(gid)).SerializeToString()
+                payload = coll + ATTR_TAG_BYTES + _VarintBytes(len(pg_attr)) + pg_attr
+                frame = coll_frames[gid] = _VarintBytes(len(payload)) + payload
+            frames.append(frame)
+
+        write_frames(path, frames)
+        written.setdefault(trace_key, path)
+
+
+def _comm_groups(num_npus, shape, active):
+    """
+    Map each comm-group ID (as a string) of the active dims to its NPUs in
+    ascending order, grouping all NPUs at once instead of appending one by one.
+    """
+    npu_ids = np.arange(num_npus)
+    group_ids = _group_ids(npu_ids, shape)
+    comm_groups = {}
+    for dim in active:
+        # Stable sort keeps the members of each group in ascending NPU order.
+        order = np.argsort(group_ids[dim], kind="stable")
+        gids, starts = np.unique(group_ids[dim][order], return_index=True)
+        members = np.split(npu_ids[order], starts[1:])
+        for gid, npus in zip(gids.tolist(), members):
+            comm_groups[str(gid)] = npus.tolist()
+    return comm_groups
+
+
+def gen_trace(output, name, shape, coll_sizes, executor=None):
     """
     Generate a Chakra trace for one job whose total NPU count is > 1.
 
@@ -51,72 +177,79 @@ def gen_trace(output, name, shape, coll_sizes):
     (duration_micros=100, is_cpu_op=False) between each consecutive pair.
     Node `.name` for the i-th dim collective is "All-Reduce-X" (i=0),
     "All-Reduce-Y" (i=1), or "All-Reduce-Z" (i=2).
+
+    If executor is given, the per-NPU files are written by its workers.
     """
-    DP, TP, PP = shape
     dim_names = ["X", "Y", "Z"]
+    num_npus = math.prod(shape)
 
     # Indices of dims that participate in a collective, in 0..2 order.
     active = [i for i, d in enumerate(shape) if d > 1]
 
-    comm_groups = {}
     job_path = output / name
     job_path.mkdir(parents=True, exist_ok=True)
 
-    for npu_id in range(math.prod(shape)):
-        xc = npu_id % DP
-        yc = (npu_id // DP) % TP
-        zc = npu_id // (DP * TP)
-
-        # Per-dim comm-group IDs. Offsets keep IDs disjoint across dims so
-        # the merged comm_groups dict has unique keys.
-        group_ids = [
-            yc + zc * TP,                         # dim 0 (DP / X)
-            xc + zc * DP + (TP * PP),             # dim 1 (TP / Y)
-            xc + yc * DP + (TP * PP) + (DP * PP), # dim 2 (PP / Z)
+    # The node sequence is the same on every NPU; only each collective's
+    # pg_name differs. Build it once: Compute nodes as ready-made frames, and
+    # collectives serialized up to their pg_name attr, which the writer appends
+    # per comm group.
+    gm_frame = frame_message(GlobalMetadata(version="0.0.4"))
+    sequence = []
+    prev_id = None
+    next_id = 1
+    for k, dim in enumerate(active):
+        if prev_id is not None:
+            comp = ChakraNode()
+            comp.id = next_id
+            next_id += 1
+            comp.name = f"Compute{k}"
+            comp.type = COMP_NODE
+            comp.duration_micros = 100
+            comp.attr.append(ChakraAttr(name="is_cpu_op", bool_val=False))
+            # Required by the simulator's roofline path
+            # (Workload::issue_comp). Without these the COMP_NODE
+            # is dropped and the chained collective never runs.
+            comp.attr.append(ChakraAttr(name="num_ops", int64_val=1))
+            comp.attr.append(ChakraAttr(name="tensor_size", int64_val=1))
+            comp.data_deps.append(prev_id)
+            sequence.append(frame_message(comp))
+            prev_id = comp.id
+
+        coll = ChakraNode()
+        coll.id = next_id
+        next_id += 1
+        coll.name = f"All-Reduce-{dim_names[dim]}"
+        coll.type = COMM_COLL_NODE
+        coll.attr.append(ChakraAttr(name="is_cpu_op", bool_val=False))
+        coll.attr.append(ChakraAttr(name="comm_type", int64_val=ALL_REDUCE))
+        coll.attr.append(ChakraAttr(name="comm_size", int64_val=coll_sizes[dim]))
+        if prev_id is not None:
+            coll.data_deps.append(prev_id)
+        sequence.append((dim, coll.SerializeToString()))
+        prev_id = coll.id
+
+    # Comm groups are a closed-form function of the NPU coordinates, so build
+    # them here while the per-NPU files are written independently.
+    comm_groups = _comm_groups(num_npus, shape, active)
+
+    if executor is None:
+        _write_npu_traces(job_path, name, shape, gm_frame, sequence, range(num_npus))
+    else:
+        # A few chunks per worker keeps them balanced without pickling the
+        # node sequence once per NPU.
+        chunk = max(1, num_npus // (4 * (os.cpu_count() or 1)))
+        futures = [
+            executor.submit(
+                _write_npu_traces, job_path, name, shape, gm_frame, sequence,
+                range(lo, min(lo + chunk, num_npus)),
+            )
+            for lo in range(0, num_npus, chunk)
         ]
+        for future in futures:
+            future.result()
 
-        with open(job_path / f"{name}.{npu_id}.et", "wb") as et:
-            encode_message(et, GlobalMetadata(version="0.0.4"))
-
-            prev_id = None
-            next_id = 1
-            for k, dim in enumerate(active):
-                if prev_id is not None:
-                    comp = ChakraNode()
-                    comp.id = next_id
-                    next_id += 1
-                    comp.name = f"Compute{k}"
-                    comp.type = COMP_NODE
-                    comp.duration_micros = 100
-                    comp.attr.append(ChakraAttr(name="is_cpu_op", bool_val=False))
-                    # Required by the simulator's roofline path
-                    # (Workload::issue_comp). Without these the COMP_NODE
-                    # is dropped and the chained collective never runs.
-                    comp.attr.append(ChakraAttr(name="num_ops", int64_val=1))
-                    comp.attr.append(ChakraAttr(name="tensor_size", int64_val=1))
-                    comp.data_deps.append(prev_id)
-                    encode_message(et, comp)
-                    prev_id = comp.id
-
-                coll = ChakraNode()
-                coll.id = next_id
-                next_id += 1
-                coll.name = f"All-Reduce-{dim_names[dim]}"
-                coll.type = COMM_COLL_NODE
-                coll.attr.append(ChakraAttr(name="is_cpu_op", bool_val=False))
-                coll.attr.append(ChakraAttr(name="comm_type", int64_val=ALL_REDUCE))
-                coll.attr.append(ChakraAttr(name="comm_size", int64_val=coll_sizes[dim]))
-                gid = str(group_ids[dim])
-                coll.attr.append(ChakraAttr(name="pg_name", string_val=gid))
-                comm_groups.setdefault(gid, []).append(npu_id)
-                if prev_id is not None:
-                    coll.data_deps.append(prev_id)
-                encode_message(et, coll)
-                prev_id = coll.id
-
-    with open(job_path / f"{name}.json", "w") as f:
-        comm_groups = {k: v for k, v in sorted(comm_groups.items())}
-        json.dump(comm_groups, f, indent=2)
+    comm_groups = {k: v for k, v in sorted(comm_groups.items())}
+    dump_json(comm_groups, job_path / f"{name}.json")
 
 
 def _parse_coll_sizes_mb(s):
@@ -160,19 +293,21 @@ if __name__ == "__main__":
     )
 
     args = parser.parse_args()
+
     output = Path(args.output)
     output.mkdir(parents=True, exist_ok=True)
 
     coll_sizes = [s * BYTES_IN_MB for s in args.coll_size_mb]
 
     jobs = parse_jobspec(args.jobspec)
-    for name, [shape, label] in jobs.items():
-        # Main jobs should be generated by STG.
-        if label == 'M':
-            continue
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for name, [shape, label] in jobs.items():
+            # Main jobs should be generated by STG.
+            if label == 'M':
+                continue
 
-        if math.prod(shape) == 1:
-            genSingleDummyTrace(output, name)
-            continue
+            if math.prod(shape) == 1:
+                genSingleDummyTrace(output, name)
+                continue
 
-        gen_trace(output, name, shape, coll_sizes)
+            gen_trace(output, name, shape, coll_sizes, executor)